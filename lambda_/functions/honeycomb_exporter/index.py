@@ -1,76 +1,102 @@
 # Standard library imports
 import base64
+import gzip
 import os
-from copy import deepcopy
-import json
-import zlib
-import dateutil.parser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 # Related third party imports
 import boto3
+import orjson
 import requests
-from google.protobuf.json_format import ParseDict
+from requests.adapters import HTTPAdapter
+
+# isal binds Intel ISA-L's SIMD-accelerated deflate decoder behind a
+# zlib-compatible API, making it a drop-in replacement that gunzips the
+# CloudWatch payloads 2-4x faster. Fall back to stdlib zlib if the layer
+# doesn't provide the wheel.
+try:
+    from isal import isal_zlib as zlib
+except ImportError:
+    import zlib
 from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
     ExportTraceServiceRequest,
 )
+from opentelemetry.proto.common.v1.common_pb2 import AnyValue, KeyValue
+from opentelemetry.proto.resource.v1.resource_pb2 import Resource
+from opentelemetry.proto.trace.v1.trace_pb2 import (
+    ResourceSpans,
+    ScopeSpans,
+    Span,
+    Status,
+)
 
 HONEYCOMB_ENDPOINT = os.environ["HONEYCOMB_ENDPOINT"]
 HONEYCOMB_KEY_SECRET = os.environ["HONEYCOMB_KEY_SECRET"]
 
-secretsmanager_client = boto3.client("secretsmanager")
-HONEYCOMB_KEY = secretsmanager_client.get_secret_value(SecretId=HONEYCOMB_KEY_SECRET)[
-    "SecretString"
-]
-
-SUPPORTED_SPAN_KEYS = [
-    "trace_id",
-    "span_id",
-    "traceState",
-    "parentSpanId",
-    "name",
-    "kind",
-    "startTimeUnixNano",
-    "endTimeUnixNano",
-    "attributes",
-    "droppedAttributesCount",
-    "events",
-    "droppedEventsCount",
-    "links",
-    "droppedLinksCount",
-    "status",
-]
-
-SUPPORTED_SPAN_EVENT_KEYS = [
-    "name",
-    "timeUnixNano",
-    "attributes",
-    "droppedAttributesCount",
-]
-
-SUPPORTED_SPAN_LINK_KEYS = [
-    "trace_id",
-    "span_id",
-    "traceState",
-    "attributes",
-    "droppedAttributesCount",
-]
+HONEYCOMB_KEY_CACHE_PATH = "/tmp/.hc_key"
 
 
-def event_handler(event, _context):
-    # Unpack Kinesis records
-    zipped_records = [rec["kinesis"]["data"] for rec in event["Records"]]
+def _get_honeycomb_key() -> str:
+    """Fetch the Honeycomb API key, caching it on the Lambda scratch disk.
 
-    # Unzip Kinesis records
-    unzipped_records = [
-        zlib.decompress(base64.b64decode(rec), 16 + zlib.MAX_WBITS).decode("utf-8")
-        for rec in zipped_records
+    /tmp is preserved within an execution environment, so the Secrets Manager
+    round-trip (and the boto3 client setup) is only paid when the cache file
+    doesn't exist yet.
+    """
+    try:
+        with open(HONEYCOMB_KEY_CACHE_PATH) as cache_file:
+            return cache_file.read()
+    except FileNotFoundError:
+        pass
+
+    secretsmanager_client = boto3.client("secretsmanager")
+    key = secretsmanager_client.get_secret_value(SecretId=HONEYCOMB_KEY_SECRET)[
+        "SecretString"
     ]
+    with open(HONEYCOMB_KEY_CACHE_PATH, "w") as cache_file:
+        cache_file.write(key)
+    return key
+
+
+HONEYCOMB_KEY = _get_honeycomb_key()
+
+# Reuse the HTTPS connections to Honeycomb across warm invocations, so only
+# the first batch in an execution environment pays the TCP/TLS handshakes.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=4))
 
-    undecodable_messages = []
-    decoded_messages = []
+# Cap the number of spans per POST so one enormous export doesn't hit
+# worst-case decode time on the receiving end.
+SPANS_PER_REQUEST = 500
 
-    # Attempt to JSON decode the CloudWatch logs messages. This should always work, since
-    # the payload looks like this:
+# The workers parallelize waiting on Honeycomb, not CPU; the Lambda VM only
+# has two vCPUs.
+EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+# The OTel library only emits a small fixed set of kind and status strings
+# ("SpanKind.INTERNAL", "OK", ...), so map them straight to their protobuf
+# enum values once instead of reformatting and resolving them per span.
+SPAN_KINDS = {
+    f"SpanKind.{name[len('SPAN_KIND_'):]}": value
+    for name, value in Span.SpanKind.items()
+}
+STATUS_CODES = {
+    name[len("STATUS_CODE_") :]: value for name, value in Status.StatusCode.items()
+}
+
+
+def event_handler(event, _context):
+    undecodable_record_count = 0
+    invalid_span_count = 0
+    otel_tracing_messages = []
+
+    # Process every Kinesis record in a single pass (unpack, unzip, JSON
+    # decode and convert to OTel protobuf format), so each record can be
+    # released before the next one is loaded. With batch sizes of 1900 records
+    # this keeps peak memory far below what separate full-batch passes would
+    # need. The JSON decode should always work, since the payload looks like
+    # this:
     # {
     #     "messageType": "DATA_MESSAGE",
     #     "owner": "739178438747",
@@ -87,66 +113,101 @@ def event_handler(event, _context):
     #         }
     #     ]
     # }
-    for record in unzipped_records:
+    for record in event["Records"]:
+        zipped_record = base64.b64decode(record["kinesis"]["data"])
+        # Pass a bufsize close to the expected output size so zlib allocates
+        # the output buffer once instead of growing it from the small default.
+        unzipped_record = zlib.decompress(
+            zipped_record, 16 + zlib.MAX_WBITS, max(2 * len(zipped_record), 65536)
+        )
         try:
-            decoded_messages.append(json.loads(record))
+            # orjson.loads accepts bytes directly, so there is no need to
+            # decode the decompressed payload to a string first.
+            decoded_message = orjson.loads(unzipped_record)
         except Exception:
-            undecodable_messages.append(record)
-
-    if undecodable_messages:
-        print(f"Could not decode {len(undecodable_messages)} from Kinesis")
+            undecodable_record_count += 1
+            continue
 
-    otel_tracing_messages = []
-    not_tracing_messages = []
-
-    # Attempt to parse every CloudWatch log line and convert it to OTel protobuf format
-    for decoded_message in decoded_messages:
-        cloudwatch_log_events = decoded_message["logEvents"]
-        for log_event in cloudwatch_log_events:
+        # Attempt to parse every CloudWatch log line and convert it to OTel
+        # protobuf format
+        for log_event in decoded_message["logEvents"]:
             try:
-                message = json.loads(log_event["message"])
+                message = orjson.loads(log_event["message"])
             except Exception:
-                not_tracing_messages.append(log_event)
+                invalid_span_count += 1
                 continue
 
             try:
                 otel_tracing_messages.append(_convert_cw_log_to_otel(message))
             except Exception as exc:
-                not_tracing_messages.append(log_event)
+                invalid_span_count += 1
                 print(
                     "Got valid JSON but could not convert it to OTel tracing format. "
                     f"Exception: {type(exc)} - {exc}. Original message on next line."
                 )
                 print(log_event["message"])
 
+    if undecodable_record_count:
+        print(f"Could not decode {undecodable_record_count} from Kinesis")
+
     print(
         f"Found {len(otel_tracing_messages)} valid spans and "
-        f"{len(not_tracing_messages)} invalid spans."
+        f"{invalid_span_count} invalid spans."
     )
 
-    # Convert all found tracing messages to the protobuf container format
+    # Group the spans per resource into ResourceSpans protobuf messages. The
+    # get/None dance costs one hash lookup per span where an "in" check
+    # followed by indexing would cost two.
     resource_spans = {}
     for resource, span in otel_tracing_messages:
-        # Spans are grouped per resource, so build a resource dictionary
         service_name = resource.get("service.name", "unknown")
-        if service_name not in resource_spans:
-            resource_spans[service_name] = {
-                "resource": resource,
-                "scopeSpans": [{"spans": []}],
-            }
-        # Add span to the scopeSpans key for the matching resource
-        resource_spans[service_name]["scopeSpans"][0]["spans"].append(span)
-
-    # Convert the protobuf-formatted JSON to actual protobuf and send it off
-    # to Honeycomb.
-    traces = {"resourceSpans": list(resource_spans.values())}
-    message = ParseDict(traces, ExportTraceServiceRequest())
-    response = requests.post(
+        bucket = resource_spans.get(service_name)
+        if bucket is None:
+            bucket = ResourceSpans(
+                resource=Resource(attributes=_parse_attributes(resource)),
+                scope_spans=[ScopeSpans()],
+            )
+            resource_spans[service_name] = bucket
+        # Add span to the scope_spans field for the matching resource
+        bucket.scope_spans[0].spans.append(span)
+
+    # Split the export into requests of at most SPANS_PER_REQUEST spans and
+    # send them to Honeycomb concurrently.
+    export_requests = []
+    for bucket in resource_spans.values():
+        spans = bucket.scope_spans[0].spans
+        for start in range(0, len(spans), SPANS_PER_REQUEST):
+            export_requests.append(
+                ExportTraceServiceRequest(
+                    resource_spans=[
+                        ResourceSpans(
+                            resource=bucket.resource,
+                            scope_spans=[
+                                ScopeSpans(
+                                    spans=spans[start : start + SPANS_PER_REQUEST]
+                                )
+                            ],
+                        )
+                    ]
+                )
+            )
+
+    # Iterating the map results re-raises the first exception, so a failed
+    # POST still fails the whole batch.
+    for _ in EXECUTOR.map(_post_traces, export_requests):
+        pass
+
+
+def _post_traces(message: ExportTraceServiceRequest):
+    # Compression level 1 costs little CPU but still shrinks the proto body
+    # considerably, reducing both egress and time-on-wire.
+    response = SESSION.post(
         HONEYCOMB_ENDPOINT,
-        data=message.SerializeToString(),
+        data=gzip.compress(message.SerializeToString(), compresslevel=1),
         headers={
             "x-honeycomb-team": HONEYCOMB_KEY,
             "content-type": "application/protobuf",
+            "content-encoding": "gzip",
         },
     )
     print(f"Honeycomb response code: {response.status_code}")
@@ -154,108 +215,79 @@ def event_handler(event, _context):
 
 
 def _convert_cw_log_to_otel(log_event: dict):
-    span = deepcopy(log_event)
-
-    # Move the "resource" key out of the span
-    resource = {"attributes": _parse_attributes(span["resource"])}
-
-    # Move the context to the root level
-    span["trace_id"] = span["context"]["trace_id"]
-    span["span_id"] = span["context"]["span_id"]
-
-    # Reformat the span kind from "SpanKind.INTERNAL" to "SPAN_KIND_INTERNAL"
-    span["kind"] = f'SPAN_KIND_{span["kind"][9:]}'
-
-    # Rename the "parent_id" key to "parentSpanId"
-    span["parentSpanId"] = span["parent_id"]
-
-    # Convert start and end time to nanoseconds
-    span["startTimeUnixNano"] = _datetime_to_nano(span["start_time"])
-    span["endTimeUnixNano"] = _datetime_to_nano(span["end_time"])
-
-    # Reformat the status code from "UNSET" to "STATUS_CODE_UNSET"
-    span["status"] = {"code": f'STATUS_CODE_{span["status"]["status_code"]}'}
-
-    # Reformat the attributes
-    span["attributes"] = _parse_attributes(span["attributes"])
-
-    # Transform each event in span events
-    span_events = []
-    for span_event in span["events"]:
-        new_span_event = deepcopy(span_event)
-        new_span_event["attributes"] = _parse_attributes(new_span_event["attributes"])
-        new_span_event["timeUnixNano"] = _datetime_to_nano(span_event["timestamp"])
-
-        # Drop any unknown fields from the event JSON
-        span_event_copy_known_fields = {}
-        for key in SUPPORTED_SPAN_EVENT_KEYS:
-            if key in new_span_event:
-                span_event_copy_known_fields[key] = new_span_event[key]
-
-        span_events.append(span_event_copy_known_fields)
-    span["events"] = span_events
-
-    # Transform each link in span links
-    span_links = []
-    for span_link in span["links"]:
-        new_span_link = deepcopy(span_link)
-        new_span_link["attributes"] = _parse_attributes(new_span_link["attributes"])
-        new_span_link["trace_id"] = span_link["context"]["trace_id"]
-        new_span_link["span_id"] = span_link["context"]["span_id"]
-
-        # Drop any unknown fields from the link JSON
-        span_link_copy_known_fields = {}
-        for key in SUPPORTED_SPAN_LINK_KEYS:
-            if key in new_span_link:
-                span_link_copy_known_fields[key] = new_span_link[key]
-
-        span_links.append(span_link_copy_known_fields)
-    span["links"] = span_links
-
-    # Drop any unknown fields from the JSON
-    span_copy_known_fields = {}
-    for key in SUPPORTED_SPAN_KEYS:
-        if key in span:
-            span_copy_known_fields[key] = span[key]
-
-    return resource, span_copy_known_fields
+    # Build the Span protobuf message directly from the log event. This keeps
+    # field assignment in the protobuf C code paths and skips the reflective
+    # per-field walk that google.protobuf.json_format.ParseDict performs.
+    parent_id = log_event["parent_id"]
+    span = Span(
+        trace_id=_id_to_bytes(log_event["context"]["trace_id"]),
+        span_id=_id_to_bytes(log_event["context"]["span_id"]),
+        parent_span_id=_id_to_bytes(parent_id) if parent_id else b"",
+        name=log_event["name"],
+        # An unknown kind raises KeyError, so the span is counted as invalid
+        kind=SPAN_KINDS[log_event["kind"]],
+        start_time_unix_nano=_datetime_to_nano(log_event["start_time"]),
+        end_time_unix_nano=_datetime_to_nano(log_event["end_time"]),
+        attributes=_parse_attributes(log_event["attributes"]),
+        events=[
+            Span.Event(
+                name=span_event["name"],
+                time_unix_nano=_datetime_to_nano(span_event["timestamp"]),
+                attributes=_parse_attributes(span_event["attributes"]),
+            )
+            for span_event in log_event["events"]
+        ],
+        links=[
+            Span.Link(
+                trace_id=_id_to_bytes(span_link["context"]["trace_id"]),
+                span_id=_id_to_bytes(span_link["context"]["span_id"]),
+                attributes=_parse_attributes(span_link["attributes"]),
+            )
+            for span_link in log_event["links"]
+        ],
+        status=Status(code=STATUS_CODES[log_event["status"]["status_code"]]),
+    )
+    return log_event["resource"], span
 
 
 def _parse_attributes(input_kv_pair):
     """
-    Convert key-value attributes to OTel protobuf format.
+    Convert key-value attributes to OTel protobuf KeyValue messages.
 
     Example input: { "key_1": "my_string", "key_2": 15 }
     Output: [
-        {
-            "key": "key_1",
-            "value": {
-                "stringValue": "my_string"
-            }
-        },
-        {
-            "key": "key_2",
-            "value": {
-                "intValue": 15
-            }
-        },
+        KeyValue(key="key_1", value=AnyValue(string_value="my_string")),
+        KeyValue(key="key_2", value=AnyValue(int_value=15)),
     ]
     """
-    response = []
-    for k, v in input_kv_pair.items():
-        type_identifier = "stringValue"
-        if isinstance(v, bool):
-            type_identifier = "boolValue"
-        elif isinstance(v, int):
-            type_identifier = "intValue"
-        elif isinstance(v, float):
-            type_identifier = "doubleValue"
+    return [_make_key_value(k, v) for k, v in input_kv_pair.items()]
+
+
+def _make_key_value(key, value):
+    """Build a KeyValue message for an attribute, picking the AnyValue field
+    by exact type. Exact-type checks are cheaper than isinstance and keep bool
+    and int apart, where isinstance(True, int) would not."""
+    value_type = type(value)
+    if value_type is str:
+        return KeyValue(key=key, value=AnyValue(string_value=value))
+    if value_type is bool:
+        return KeyValue(key=key, value=AnyValue(bool_value=value))
+    if value_type is int:
+        return KeyValue(key=key, value=AnyValue(int_value=value))
+    if value_type is float:
+        return KeyValue(key=key, value=AnyValue(double_value=value))
+    return KeyValue(key=key, value=AnyValue(string_value=str(value)))
+
 
-        response.append({"key": k, "value": {type_identifier: v}})
-    return response
+def _id_to_bytes(id_hexstr) -> bytes:
+    """Convert a "0x"-prefixed hexadecimal trace or span ID to raw bytes."""
+    return bytes.fromhex(id_hexstr[2:] if id_hexstr.startswith("0x") else id_hexstr)
 
 
 def _datetime_to_nano(datetime_isostr) -> int:
     """Convert an ISO 8601 date to a timestamp with nanosecond accuracy."""
-    date = dateutil.parser.isoparse(datetime_isostr)
-    return int(date.timestamp() * 1000 * 1000 * 1000)
+    # datetime.fromisoformat is implemented in C, but doesn't accept the
+    # trailing "Z" the OTel library emits, so rewrite it to a UTC offset.
+    if datetime_isostr.endswith("Z"):
+        datetime_isostr = datetime_isostr[:-1] + "+00:00"
+    return int(datetime.fromisoformat(datetime_isostr).timestamp() * 1_000_000_000)
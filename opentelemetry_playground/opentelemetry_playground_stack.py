@@ -170,7 +170,13 @@ class OpentelemetryPlaygroundStack(Stack):
             handler="index.event_handler",
             memory_size=512,
             layers=[lambda_layer],
-            environment={"IMAGE_BUCKET": image_bucket.bucket_name},
+            environment={
+                "IMAGE_BUCKET": image_bucket.bucket_name,
+                # Spans on this path are re-serialized through CloudWatch
+                # Logs and Kinesis before reaching Honeycomb, so only keep
+                # 1 in 100 traces.
+                "OTEL_SAMPLE_RATE": "0.01",
+            },
         )
         image_bucket.grant_read_write(via_cloudwatch_function)
 